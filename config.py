@@ -1,32 +1,76 @@
 import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Tuple
 from dotenv import load_dotenv
 
 
 load_dotenv()
 
 
-ROBOFLOW_API_URL = os.getenv("ROBOFLOW_API_URL", "https://serverless.roboflow.com")
-
-ROBOFLOW_API_KEY = os.getenv("ROBOFLOW_API_KEY", "")
-
-ROBOFLOW_MODEL_ID = os.getenv("ROBOFLOW_MODEL_ID", "cloud-types2-vljyy/1")
-
-
-
-OPENWEATHER_API_KEY = os.getenv("weatherLOC") or os.getenv("OPENWEATHER_API_KEY", "")
 OPENWEATHER_BASE_URL = "https://api.openweathermap.org/data/2.5"
 
-
-if not OPENWEATHER_API_KEY:
-
-	pass
-
 # App Configuration
 APP_TITLE = "Cloud Detection & Weather Monitoring"
 APP_VERSION = "1.0.0"
 APP_DESCRIPTION = "FastAPI backend for cloud detection using Roboflow and weather data from OpenWeatherMap"
- 
 
-# Default FRONTEND_URL should point to the deployed frontend. It can be
-# overridden via the FRONTEND_URL environment variable (used in Render).
-FRONTEND_URL = os.getenv("FRONTEND_URL", "https://cloud-d-weather.vercel.app")
\ No newline at end of file
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    """Environment-derived configuration, parsed once per process"""
+
+    roboflow_api_url: str
+    roboflow_api_key: str
+    roboflow_model_id: str
+    model_input_side: int
+    openweather_api_key: str
+    frontend_url: str
+    web_workers: int
+    # Deduplicated origins allowed by CORS, frontend_url first
+    cors_origins: Tuple[str, ...]
+    inference_queue_maxsize: int
+    inference_workers: int
+    inference_request_timeout: float  # seconds
+    inference_batch_max: int
+    inference_batch_timeout_ms: float
+    # Queued frames older than this are dropped instead of being sent to Roboflow
+    inference_max_stale_ms: float
+    # How long (seconds) fetched weather data is served from the in-process cache
+    weather_ttl_current: float
+    weather_ttl_forecast: float
+    # Maximum number of (location, endpoint) entries kept in that cache
+    weather_cache_size: int
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """Read the environment into a Settings instance (cached after the first call)"""
+    # Default FRONTEND_URL should point to the deployed frontend. It can be
+    # overridden via the FRONTEND_URL environment variable (used in Render).
+    frontend_url = os.getenv("FRONTEND_URL", "https://cloud-d-weather.vercel.app")
+    cors_origins = (
+        frontend_url,
+        "http://localhost:3000",
+        "http://127.0.0.1:3000",
+        "https://cloud-d-weather.vercel.app",
+    )
+    return Settings(
+        roboflow_api_url=os.getenv("ROBOFLOW_API_URL", "https://serverless.roboflow.com"),
+        roboflow_api_key=os.getenv("ROBOFLOW_API_KEY", ""),
+        roboflow_model_id=os.getenv("ROBOFLOW_MODEL_ID", "cloud-types2-vljyy/1"),
+        model_input_side=int(os.getenv("MODEL_INPUT_SIDE", "640")),
+        openweather_api_key=os.getenv("weatherLOC") or os.getenv("OPENWEATHER_API_KEY", ""),
+        frontend_url=frontend_url,
+        web_workers=int(os.getenv("WEB_WORKERS", "1")),
+        cors_origins=tuple(dict.fromkeys(origin for origin in cors_origins if origin)),
+        inference_queue_maxsize=int(os.getenv("INFERENCE_QUEUE_MAXSIZE", "4")),
+        inference_workers=int(os.getenv("INFERENCE_WORKERS", "2")),
+        inference_request_timeout=float(os.getenv("INFERENCE_REQUEST_TIMEOUT", "15")),
+        inference_batch_max=int(os.getenv("INFERENCE_BATCH_MAX", "4")),
+        inference_batch_timeout_ms=float(os.getenv("INFERENCE_BATCH_TIMEOUT_MS", "20")),
+        inference_max_stale_ms=float(os.getenv("INFERENCE_MAX_STALE_MS", "5000")),
+        weather_ttl_current=float(os.getenv("WEATHER_TTL_CURRENT", "60")),
+        weather_ttl_forecast=float(os.getenv("WEATHER_TTL_FORECAST", "900")),
+        weather_cache_size=int(os.getenv("WEATHER_CACHE_SIZE", "256")),
+    )
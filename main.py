@@ -1,44 +1,45 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 import uvicorn
-import io
-from PIL import Image
-import tempfile
-import os
 import asyncio
-from typing import Optional, Tuple
-
-from config import (
-    APP_TITLE,
-    APP_VERSION,
-    APP_DESCRIPTION,
-    FRONTEND_URL,
-    ROBOFLOW_API_KEY,
-    ROBOFLOW_MODEL_ID,
-    OPENWEATHER_API_KEY,
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from config import APP_TITLE, APP_VERSION, APP_DESCRIPTION, get_settings
+from schemas import (
+    AnalysisResp,
+    CurrentWeatherResp,
+    DetectionResp,
+    ForecastResp,
+    HealthResp,
+    RootResp,
 )
 from services.roboflow_service import RoboflowService
 from services.weather_service import WeatherService
 
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
 # Initialize FastAPI app
 app = FastAPI(
     title=APP_TITLE,
     version=APP_VERSION,
-    description=APP_DESCRIPTION
+    description=APP_DESCRIPTION,
+    default_response_class=ORJSONResponse,
 )
 
 
-cors_origins = [
-    FRONTEND_URL,
-    "http://localhost:3000",
-    "http://127.0.0.1:3000",
-    "https://cloud-d-weather.vercel.app",
-]
+# Compress larger JSON payloads (forecasts in particular); small responses are
+# sent as-is. Added before CORS so CORS stays the outermost layer.
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[o for o in cors_origins if o],
+    allow_origins=settings.cors_origins,
     allow_credentials=True,
     allow_methods=["GET", "POST", "OPTIONS"],
     allow_headers=["*"],
@@ -51,48 +52,160 @@ roboflow_service = RoboflowService()
 weather_service = WeatherService()
 
 
-INFERENCE_QUEUE_MAXSIZE = int(os.getenv("INFERENCE_QUEUE_MAXSIZE", "4"))
-INFERENCE_REQUEST_TIMEOUT = float(os.getenv("INFERENCE_REQUEST_TIMEOUT", "15"))  # seconds
-inference_queue: "asyncio.Queue[Tuple[asyncio.Future, str, str]]" = asyncio.Queue(maxsize=INFERENCE_QUEUE_MAXSIZE)
+class FreshestFirstQueue(asyncio.Queue):
+    """Bounded queue that serves the newest request first.
+
+    For live streams a recent frame is worth more than an old one, so when the
+    queue is full the oldest waiting request is failed with 429 to make room,
+    instead of rejecting the new one. Items are (future, ...) tuples.
+    """
+
+    def _get(self):
+        return self._queue.pop()
+
+    def put_nowait(self, item):
+        if self.full():
+            future = self._queue.popleft()[0]
+            if not future.done():
+                future.set_exception(HTTPException(
+                    status_code=429,
+                    detail="Frame dropped in favour of a newer one. Reduce FPS to avoid this.",
+                ))
+            self.task_done()
+        super().put_nowait(item)
+
+
+# (future, image_bytes, enqueued_at)
+InferenceItem = Tuple[asyncio.Future, bytes, float]
+inference_queue: "asyncio.Queue[InferenceItem]" = FreshestFirstQueue(maxsize=settings.inference_queue_maxsize)
+# Roboflow calls get their own threads so they never queue behind other blocking
+# work on the event loop's default executor. One thread per inference worker.
+inference_pool = ThreadPoolExecutor(max_workers=settings.inference_workers, thread_name_prefix="rf-infer")
+
+
+async def _next_inference_batch() -> List[InferenceItem]:
+    """Wait for one queued request, then keep collecting until the batch holds
+    settings.inference_batch_max items or settings.inference_batch_timeout_ms
+    has elapsed.
+    """
+    loop = asyncio.get_running_loop()
+    batch = [await inference_queue.get()]
+    deadline = loop.time() + settings.inference_batch_timeout_ms / 1000
+    while len(batch) < settings.inference_batch_max:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(await asyncio.wait_for(inference_queue.get(), remaining))
+        except asyncio.TimeoutError:
+            break
+    return batch
+
+
+def _discard_stale(batch: List[InferenceItem]) -> List[InferenceItem]:
+    """Fail requests that waited longer than settings.inference_max_stale_ms and
+    return the ones still worth running.
+
+    Requests whose caller has already given up (e.g. timed out with a 503) are
+    dropped too, so no inference is spent on a result nobody will read.
+    """
+    cutoff = asyncio.get_running_loop().time() - settings.inference_max_stale_ms / 1000
+    fresh = []
+    for item in batch:
+        future = item[0]
+        if future.done():
+            inference_queue.task_done()
+            continue
+        if item[2] >= cutoff:
+            fresh.append(item)
+            continue
+        future.set_exception(HTTPException(
+            status_code=429,
+            detail="Frame waited too long and was dropped. Reduce FPS to avoid this.",
+        ))
+        inference_queue.task_done()
+    return fresh
+
+
+async def _run_inference(image_data: bytes) -> dict:
+    """Queue an image for the inference workers and wait for its detections.
+
+    If the queue is full the oldest waiting frame is dropped with a 429 so its
+    client can back off (the frontend LiveStream has an FPS slider to help
+    control rate). Waiting is bounded by settings.inference_request_timeout.
+    """
+    loop = asyncio.get_running_loop()
+    future: asyncio.Future = loop.create_future()
+    inference_queue.put_nowait((future, image_data, loop.time()))
+
+    try:
+        return await asyncio.wait_for(future, timeout=settings.inference_request_timeout)
+    except asyncio.TimeoutError:
+        # If the request times out, the worker may still finish later, but
+        # we inform the client to retry or lower the rate.
+        raise HTTPException(status_code=503, detail="Inference timeout. Try reducing FPS or retrying.")
 
 
 async def _inference_worker() -> None:
-    """Background worker that processes inference requests from the queue one-by-one.
+    """Background worker that processes inference requests from the queue in
+    micro-batches.
 
-    Each queued item is a tuple (future, temp_file_path, original_filename). The
-    worker runs the blocking Roboflow client in a thread to avoid blocking the
-    event loop.
+    Each queued item is a tuple (future, image_bytes, enqueued_at). The worker
+    drops stale items and sends the rest to Roboflow together, run on
+    inference_pool to avoid blocking the event loop. Each future is resolved
+    with its own formatted detections, or with the error for that image only.
     """
+    loop = asyncio.get_running_loop()
     while True:
-        future, temp_path, orig_filename = await inference_queue.get()
+        batch = _discard_stale(await _next_inference_batch())
+        if not batch:
+            continue
         try:
-            # Run the blocking detection in a threadpool
-            result = await asyncio.to_thread(roboflow_service.detect_clouds, temp_path)
-            if not future.done():
-                future.set_result({
-                    "success": True,
-                    "filename": orig_filename,
-                    "predictions": result,
-                })
+            # Run the blocking detection in the dedicated threadpool
+            results = await loop.run_in_executor(
+                inference_pool,
+                roboflow_service.detect_clouds_batch,
+                [image_data for _, image_data, _ in batch],
+            )
+            for (future, _, _), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
         except Exception as e:
-            if not future.done():
-                future.set_exception(e)
+            for future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
         finally:
-            # Attempt to remove temp file; ignore errors
-            try:
-                if os.path.exists(temp_path):
-                    os.unlink(temp_path)
-            except Exception:
-                pass
-            inference_queue.task_done()
+            for _ in batch:
+                inference_queue.task_done()
 
 
 @app.on_event("startup")
 async def startup_event_queue():
-    # Start background worker
-    asyncio.create_task(_inference_worker())
+    # Start background workers; several let Roboflow round-trips overlap
+    for _ in range(settings.inference_workers):
+        asyncio.create_task(_inference_worker())
+
 
-@app.get("/")
+@app.on_event("shutdown")
+async def shutdown_event_queue():
+    inference_pool.shutdown(wait=False, cancel_futures=True)
+
+
+@app.on_event("startup")
+async def startup_event_weather():
+    # Open the shared weather HTTP client up front so the first request doesn't pay for it
+    await weather_service._get_client()
+
+
+@app.on_event("shutdown")
+async def shutdown_event_weather():
+    await weather_service.close()
+
+@app.get("/", response_model=RootResp)
 async def root():
     """Health check endpoint"""
     return {
@@ -102,7 +215,7 @@ async def root():
     }
 
 
-@app.get("/health")
+@app.get("/health", response_model=HealthResp)
 async def health():
     """Return health information including presence of required API keys.
 
@@ -110,21 +223,21 @@ async def health():
     attempting user-facing operations (like live inference).
     """
     missing = []
-    if not ROBOFLOW_API_KEY:
+    if not settings.roboflow_api_key:
         missing.append("ROBOFLOW_API_KEY")
-    if not ROBOFLOW_MODEL_ID:
+    if not settings.roboflow_model_id:
         missing.append("ROBOFLOW_MODEL_ID")
-    if not OPENWEATHER_API_KEY:
+    if not settings.openweather_api_key:
         missing.append("OPENWEATHER_API_KEY")
 
-    return JSONResponse(content={
+    return {
         "success": True,
         "service": "cloud-detection",
         "missing_keys": missing,
         "healthy": len(missing) == 0,
-    })
+    }
 
-@app.post("/detect-clouds")
+@app.post("/detect-clouds", response_model=DetectionResp)
 async def detect_clouds(file: UploadFile = File(...)):
     """
     Detect cloud types in an uploaded image using Roboflow model
@@ -134,41 +247,23 @@ async def detect_clouds(file: UploadFile = File(...)):
         if not file.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail="File must be an image")
         
-        # Read image data and write to a temporary file. The file is handed off to
-        # the background inference worker which is responsible for cleanup.
+        # The raw bytes are handed to the background inference worker, which passes
+        # them to Roboflow directly without touching disk.
         image_data = await file.read()
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as temp_file:
-            temp_file.write(image_data)
-            temp_file_path = temp_file.name
-
-        # Enqueue the request. If the queue is full, return 429 so the client can
-        # back off (the frontend LiveStream has an FPS slider to help control rate).
-        try:
-            future: asyncio.Future = asyncio.get_running_loop().create_future()
-            # Attempt to put without waiting — if full, raise immediately
-            inference_queue.put_nowait((future, temp_file_path, file.filename))
-        except asyncio.QueueFull:
-            # Clean up temp file since worker won't handle it
-            try:
-                os.unlink(temp_file_path)
-            except Exception:
-                pass
-            raise HTTPException(status_code=429, detail="Server is busy. Please slow down live uploads or reduce FPS.")
-
-        # Wait for the inference result with a timeout so requests don't hang
-        try:
-            result = await asyncio.wait_for(future, timeout=INFERENCE_REQUEST_TIMEOUT)
-            return JSONResponse(content=result)
-        except asyncio.TimeoutError:
-            # If the request times out, the worker may still finish later, but
-            # we inform the client to retry or lower the rate.
-            raise HTTPException(status_code=503, detail="Inference timeout. Try reducing FPS or retrying.")
+        predictions = await _run_inference(image_data)
+        return {
+            "success": True,
+            "filename": file.filename,
+            "predictions": predictions,
+        }
             
+    except HTTPException:
+        raise  # Keep deliberate 4xx/5xx status codes
     except Exception as e:
+        logger.exception("Error processing image")
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
-@app.get("/weather")
+@app.get("/weather", response_model=CurrentWeatherResp)
 async def get_weather(
     city: str = Query(..., description="City name"),
     country: Optional[str] = Query(None, description="Country code (optional)")
@@ -179,15 +274,16 @@ async def get_weather(
     try:
         location = f"{city},{country}" if country else city
         weather_data = await weather_service.get_current_weather(location)
-        return JSONResponse(content={
+        return {
             "success": True,
             "location": location,
             "weather": weather_data
-        })
+        }
     except Exception as e:
+        logger.exception("Error fetching weather")
         raise HTTPException(status_code=500, detail=f"Error fetching weather: {str(e)}")
 
-@app.get("/weather/forecast")
+@app.get("/weather/forecast", response_model=ForecastResp)
 async def get_weather_forecast(
     city: str = Query(..., description="City name"),
     country: Optional[str] = Query(None, description="Country code (optional)"),
@@ -202,18 +298,21 @@ async def get_weather_forecast(
         
         location = f"{city},{country}" if country else city
         forecast_data = await weather_service.get_forecast(location, days)
-        return JSONResponse(content={
+        return {
             "success": True,
             "location": location,
             "forecast": forecast_data
-        })
+        }
+    except HTTPException:
+        raise  # Keep deliberate 4xx/5xx status codes
     except Exception as e:
+        logger.exception("Error fetching forecast")
         raise HTTPException(status_code=500, detail=f"Error fetching forecast: {str(e)}")
 
 
 # History endpoints removed as requested
 
-@app.post("/analyze")
+@app.post("/analyze", response_model=AnalysisResp)
 async def analyze_clouds_and_weather(
     file: UploadFile = File(...),
     city: str = Query(..., description="City name"),
@@ -228,31 +327,32 @@ async def analyze_clouds_and_weather(
             raise HTTPException(status_code=400, detail="File must be an image")
         
         image_data = await file.read()
+        location = f"{city},{country}" if country else city
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as temp_file:
-            temp_file.write(image_data)
-            temp_file_path = temp_file.name
+        # Detection goes through the shared inference queue; it and the weather
+        # lookup are independent, so run them concurrently
+        cloud_result, weather_data = await asyncio.gather(
+            _run_inference(image_data),
+            weather_service.get_current_weather(location),
+        )
         
-        try:
-            # Run cloud detection
-            cloud_result = roboflow_service.detect_clouds(temp_file_path)
-            
-            # Get weather data
-            location = f"{city},{country}" if country else city
-            weather_data = await weather_service.get_current_weather(location)
-            
-            return JSONResponse(content={
-                "success": True,
-                "filename": file.filename,
-                "location": location,
-                "cloud_detection": cloud_result,
-                "weather": weather_data
-            })
-        finally:
-            os.unlink(temp_file_path)
+        return {
+            "success": True,
+            "filename": file.filename,
+            "location": location,
+            "cloud_detection": cloud_result,
+            "weather": weather_data
+        }
             
+    except HTTPException:
+        raise  # Keep deliberate 4xx/5xx status codes
     except Exception as e:
+        logger.exception("Error processing request")
         raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Multiple workers need an import string; a single one reuses this module's
+    # app instead of importing main (and its services) a second time.
+    # The default loop="auto"/http="auto" already prefer uvloop and httptools.
+    target = "main:app" if settings.web_workers > 1 else app
+    uvicorn.run(target, host="0.0.0.0", port=8000, workers=settings.web_workers)
@@ -0,0 +1,172 @@
+"""Response models for the API endpoints.
+
+These mirror the dicts built by the services. Declaring them as response_model
+lets FastAPI validate and serialize responses in pydantic-core and documents
+the payloads in the OpenAPI schema.
+"""
+from typing import List, Optional, Union
+from pydantic import BaseModel, ConfigDict, Field
+
+# Keeps ints as ints and floats as floats when serialized
+Number = Union[int, float]
+
+
+class _Schema(BaseModel):
+    # protected_namespaces=() allows the model_id field without a pydantic warning
+    model_config = ConfigDict(extra="ignore", protected_namespaces=())
+
+
+class RootResp(_Schema):
+    message: str
+    version: str
+    status: str
+
+
+class HealthResp(_Schema):
+    success: bool
+    service: str
+    missing_keys: List[str]
+    healthy: bool
+
+
+# Cloud detection
+
+class BoundingBox(_Schema):
+    x: Optional[Number] = None
+    y: Optional[Number] = None
+    width: Optional[Number] = None
+    height: Optional[Number] = None
+
+
+class Prediction(_Schema):
+    class_: Optional[str] = Field(None, alias="class")
+    confidence: Number = 0
+    bounding_box: Optional[BoundingBox] = None
+
+
+class ImageDimensions(_Schema):
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+
+class DetectionSummary(_Schema):
+    total_detections: int = 0
+    confidence_threshold: Optional[float] = None
+
+
+class CloudDetection(_Schema):
+    model_id: Optional[str] = None
+    image_dimensions: Optional[ImageDimensions] = None
+    predictions: List[Prediction] = []
+    summary: Optional[DetectionSummary] = None
+
+
+class DetectionResp(_Schema):
+    success: bool
+    filename: Optional[str] = None
+    predictions: CloudDetection
+
+
+# Weather
+
+class Coordinates(_Schema):
+    lat: Optional[Number] = None
+    lon: Optional[Number] = None
+
+
+class WeatherLocation(_Schema):
+    name: Optional[str] = None
+    country: Optional[str] = None
+    coordinates: Optional[Coordinates] = None
+
+
+class CurrentConditions(_Schema):
+    temperature: Optional[Number] = None
+    feels_like: Optional[Number] = None
+    humidity: Optional[Number] = None
+    pressure: Optional[Number] = None
+    description: Optional[str] = None
+    main: Optional[str] = None
+    icon: Optional[str] = None
+    visibility: Optional[Number] = None
+    uv_index: Optional[Number] = None
+
+
+class Wind(_Schema):
+    speed: Optional[Number] = None
+    direction: Optional[Number] = None
+    gust: Optional[Number] = None
+
+
+class Clouds(_Schema):
+    coverage: Optional[Number] = None
+
+
+class Sun(_Schema):
+    sunrise: Optional[int] = None
+    sunset: Optional[int] = None
+
+
+class CurrentWeather(_Schema):
+    location: Optional[WeatherLocation] = None
+    current: Optional[CurrentConditions] = None
+    wind: Optional[Wind] = None
+    clouds: Optional[Clouds] = None
+    sun: Optional[Sun] = None
+    timestamp: Optional[int] = None
+
+
+class CurrentWeatherResp(_Schema):
+    success: bool
+    location: str
+    weather: CurrentWeather
+
+
+class ForecastTemperature(_Schema):
+    current: Optional[Number] = None
+    min: Optional[Number] = None
+    max: Optional[Number] = None
+    feels_like: Optional[Number] = None
+
+
+class ForecastConditions(_Schema):
+    main: Optional[str] = None
+    description: Optional[str] = None
+    icon: Optional[str] = None
+
+
+class Precipitation(_Schema):
+    probability: Optional[Number] = None
+
+
+class ForecastEntry(_Schema):
+    datetime: Optional[int] = None
+    temperature: Optional[ForecastTemperature] = None
+    humidity: Optional[Number] = None
+    pressure: Optional[Number] = None
+    weather: Optional[ForecastConditions] = None
+    wind: Optional[Wind] = None
+    clouds: Optional[Clouds] = None
+    precipitation: Optional[Precipitation] = None
+
+
+class Forecast(_Schema):
+    location: Optional[WeatherLocation] = None
+    forecast: List[ForecastEntry] = []
+    forecast_days: Optional[int] = None
+
+
+class ForecastResp(_Schema):
+    success: bool
+    location: str
+    forecast: Forecast
+
+
+# Combined analysis
+
+class AnalysisResp(_Schema):
+    success: bool
+    filename: Optional[str] = None
+    location: str
+    cloud_detection: CloudDetection
+    weather: CurrentWeather
@@ -1,6 +1,11 @@
-from inference_sdk import InferenceHTTPClient
-from config import ROBOFLOW_API_URL, ROBOFLOW_API_KEY, ROBOFLOW_MODEL_ID
+from inference_sdk import InferenceConfiguration, InferenceHTTPClient
+from PIL import ExifTags, Image, ImageOps
+from typing import List, Tuple, Union
+from config import get_settings
+import io
 import logging
+import threading
+from operator import itemgetter
 
 logger = logging.getLogger(__name__)
 
@@ -11,37 +16,168 @@ class RoboflowService:
         """Prepare service. Client initialization is deferred until needed so
         the app can start even if the API key is not yet configured.
         """
+        settings = get_settings()
         self.client = None
-        self.model_id = ROBOFLOW_MODEL_ID
+        # Inference runs on several threads; guard the lazy client creation
+        self._client_lock = threading.Lock()
+        self.model_id = settings.roboflow_model_id
+        # Longest image side sent to Roboflow; larger uploads are downscaled first
+        self.model_input_side = settings.model_input_side
+        # Images in one batch are sent to Roboflow as this many parallel requests
+        self._max_concurrent_requests = settings.inference_batch_max
         # Keep configuration values but do not raise here; raise only when used.
-        if not ROBOFLOW_API_KEY:
+        self._api_url = settings.roboflow_api_url
+        self._api_key = settings.roboflow_api_key
+        if not self._api_key:
             logger.warning("Roboflow API key not configured. Set ROBOFLOW_API_KEY in .env to enable inference.")
     
-    def detect_clouds(self, image_path: str) -> dict:
+    def detect_clouds(self, image: Union[bytes, Image.Image]) -> dict:
         """
         Detect cloud types in an image
         
         Args:
-            image_path (str): Path to the image file
+            image (Union[bytes, Image.Image]): Encoded image bytes or a PIL image
             
         Returns:
             dict: Detection results from Roboflow API
         """
+        result = self.detect_clouds_batch([image])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def detect_clouds_batch(self, images: List[Union[bytes, Image.Image]]) -> List[Union[dict, Exception]]:
+        """
+        Detect cloud types in several images
+
+        The hosted API takes one image per request, so the client sends the batch
+        as parallel requests. A failure only affects the image that caused it.
+
+        Args:
+            images (List[Union[bytes, Image.Image]]): Encoded image bytes or PIL images
+
+        Returns:
+            List[Union[dict, Exception]]: For each image, in order, its detection
+            results or the exception it failed with
+        """
         try:
             # Ensure client is initialized (lazy init)
             self._ensure_client()
-            result = self.client.infer(image_path, model_id=self.model_id)
-            
-            # Process and format the results
-            formatted_result = self._format_predictions(result)
-            
-            logger.info(f"Successfully processed image: {image_path}")
-            return formatted_result
-        
         except Exception as e:
             logger.error(f"Error during cloud detection: {e}")
             raise Exception(f"Cloud detection failed: {str(e)}")
 
+        outcomes: List[Union[dict, Exception]] = [None] * len(images)
+        prepared = []  # (index, image, (scale_x, scale_y))
+        for index, image in enumerate(images):
+            try:
+                prepared.append((index, *self._prepare_image(image)))
+            except Exception as e:
+                outcomes[index] = e
+
+        raw_results = self._infer_each([image for _, image, _ in prepared]) if prepared else []
+        for (index, _, scale), raw in zip(prepared, raw_results):
+            try:
+                if isinstance(raw, Exception):
+                    raise raw
+                # Process and format the results
+                outcomes[index] = self._format_predictions(self._restore_scale(raw, scale))
+            except Exception as e:
+                outcomes[index] = e
+
+        for index, outcome in enumerate(outcomes):
+            if isinstance(outcome, Exception):
+                logger.error(f"Error during cloud detection: {outcome}")
+                outcomes[index] = Exception(f"Cloud detection failed: {str(outcome)}")
+
+        logger.info(f"Processed batch of {len(images)} images")
+        return outcomes
+
+    def _infer(self, images: List[Image.Image]) -> List[dict]:
+        """Run the model on images with one client call; results are in order"""
+        results = self.client.infer(images, model_id=self.model_id)
+        # The client unwraps single-element lists into a bare dict
+        if isinstance(results, dict):
+            results = [results]
+        if len(results) != len(images):
+            raise Exception(f"Roboflow returned {len(results)} results for {len(images)} images")
+        return results
+
+    def _infer_each(self, images: List[Image.Image]) -> List[Union[dict, Exception]]:
+        """
+        Run the model on images, isolating failures per image
+
+        Any error response fails the whole client call, so when a batched call
+        fails the images are retried one at a time to find out which ones are bad.
+        """
+        try:
+            return self._infer(images)
+        except Exception as e:
+            if len(images) == 1:
+                return [e]
+            logger.warning(f"Batched inference failed ({e}); retrying images individually")
+
+        outcomes: List[Union[dict, Exception]] = []
+        for image in images:
+            try:
+                outcomes.extend(self._infer([image]))
+            except Exception as e:
+                outcomes.append(e)
+        return outcomes
+
+    def _prepare_image(self, image: Union[bytes, Image.Image]) -> Tuple[Image.Image, Tuple[float, float]]:
+        """
+        Decode an image and shrink it to the model input size before upload
+
+        The Roboflow client accepts PIL images but not raw bytes, and there is no
+        point shipping more pixels than the model looks at.
+
+        Args:
+            image (Union[bytes, Image.Image]): Encoded image bytes or a PIL image
+
+        Returns:
+            Tuple[Image.Image, Tuple[float, float]]: The image to send, and the x and
+            y factors mapping its coordinates back to the original image
+        """
+        if isinstance(image, bytes):
+            image = Image.open(io.BytesIO(image))
+        else:
+            image = image.copy()  # thumbnail resizes in place
+
+        # Size as the image is displayed: orientations 5-8 swap width and height
+        original_width, original_height = image.size
+        if image.getexif().get(ExifTags.Base.Orientation, 1) in (5, 6, 7, 8):
+            original_width, original_height = original_height, original_width
+
+        # Shrink first so JPEGs can be draft-decoded at reduced scale; the square
+        # bound gives the same result whichever way the image is rotated
+        image.thumbnail((self.model_input_side, self.model_input_side), Image.Resampling.BILINEAR)
+        # Phone photos are often stored sideways with an EXIF orientation tag, which
+        # is lost when the client re-encodes; bake the rotation into the pixels
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "L"):
+            # The client re-encodes as JPEG, which has no alpha/palette support
+            image = image.convert("RGB")
+        # thumbnail rounds each side separately, so the two ratios can differ
+        return image, (original_width / image.width, original_height / image.height)
+
+    @staticmethod
+    def _restore_scale(raw_result: dict, scale: Tuple[float, float]) -> dict:
+        """Map boxes and image size from the downscaled image back to the original"""
+        scale_x, scale_y = scale
+        if (scale_x == 1 and scale_y == 1) or not isinstance(raw_result, dict):
+            return raw_result
+
+        image = raw_result.get("image")
+        if image:
+            image["width"] = round(image.get("width", 0) * scale_x)
+            image["height"] = round(image.get("height", 0) * scale_y)
+        for prediction in raw_result.get("predictions", []):
+            for key, factor in (("x", scale_x), ("y", scale_y), ("width", scale_x), ("height", scale_y)):
+                if prediction.get(key) is not None:
+                    prediction[key] = prediction[key] * factor
+        return raw_result
+
     def _ensure_client(self):
         """Initialize the Roboflow client if it hasn't been created yet.
 
@@ -50,18 +186,21 @@ class RoboflowService:
         if self.client is not None:
             return
 
-        if not ROBOFLOW_API_KEY:
+        if not self._api_key:
             raise Exception("Roboflow API key is not set. Please set ROBOFLOW_API_KEY in your .env file.")
 
-        try:
-            self.client = InferenceHTTPClient(
-                api_url=ROBOFLOW_API_URL,
-                api_key=ROBOFLOW_API_KEY
-            )
-            logger.info("Roboflow client initialized successfully")
-        except Exception as e:
-            logger.error(f"Failed to initialize Roboflow client: {e}")
-            raise
+        with self._client_lock:
+            if self.client is not None:
+                return
+            try:
+                self.client = InferenceHTTPClient(
+                    api_url=self._api_url,
+                    api_key=self._api_key
+                ).configure(InferenceConfiguration(max_concurrent_requests=self._max_concurrent_requests))
+                logger.info("Roboflow client initialized successfully")
+            except Exception as e:
+                logger.error(f"Failed to initialize Roboflow client: {e}")
+                raise
     
     def _format_predictions(self, raw_result: dict) -> dict:
         """
@@ -74,40 +213,39 @@ class RoboflowService:
             dict: Formatted prediction results
         """
         try:
-            formatted = {
+            predictions = raw_result.get("predictions", [])
+
+            # Round once, then sort on the precomputed key (highest confidence first)
+            ranked = [(round(p.get("confidence", 0), 3), p) for p in predictions]
+            ranked.sort(key=itemgetter(0), reverse=True)
+
+            image = raw_result.get("image") or {}
+            return {
                 "model_id": raw_result.get("model_id", self.model_id),
                 "image_dimensions": {
-                    "width": raw_result.get("image", {}).get("width"),
-                    "height": raw_result.get("image", {}).get("height")
+                    "width": image.get("width"),
+                    "height": image.get("height")
                 },
-                "predictions": [],
+                "predictions": [
+                    {
+                        "class": p.get("class"),
+                        "confidence": confidence,
+                        "bounding_box": {
+                            "x": p.get("x"),
+                            "y": p.get("y"),
+                            "width": p.get("width"),
+                            "height": p.get("height")
+                        }
+                    }
+                    for confidence, p in ranked
+                ],
                 "summary": {
-                    "total_detections": 0,
+                    "total_detections": len(predictions),
                     "confidence_threshold": 0.5
                 }
             }
             
-            predictions = raw_result.get("predictions", [])
-            formatted["summary"]["total_detections"] = len(predictions)
-            
-            for prediction in predictions:
-                formatted_prediction = {
-                    "class": prediction.get("class"),
-                    "confidence": round(prediction.get("confidence", 0), 3),
-                    "bounding_box": {
-                        "x": prediction.get("x"),
-                        "y": prediction.get("y"),
-                        "width": prediction.get("width"),
-                        "height": prediction.get("height")
-                    }
-                }
-                formatted["predictions"].append(formatted_prediction)
-            
-            # Sort predictions by confidence
-            formatted["predictions"].sort(key=lambda x: x["confidence"], reverse=True)
-            
-            return formatted
-            
         except Exception as e:
             logger.error(f"Error formatting predictions: {e}")
-            return raw_result  # Return raw result if formatting fails
\ No newline at end of file
+            # Raw Roboflow output doesn't fit the response model, so fail loudly
+            raise Exception(f"Unexpected response from Roboflow: {str(e)}")
\ No newline at end of file
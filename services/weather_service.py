@@ -1,24 +1,128 @@
-import aiohttp
-from typing import Dict, Any, Optional
-from config import OPENWEATHER_API_KEY, OPENWEATHER_BASE_URL
+import asyncio
+import httpx
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Any, Optional, Tuple
+from config import OPENWEATHER_BASE_URL, get_settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Shared fallbacks for missing sections of an API response. Only ever read from,
+# so one instance can stand in for every missing key.
+_EMPTY: Dict[str, Any] = {}
+_EMPTY_LIST = (_EMPTY,)
+
 class WeatherService:
     """Service for fetching weather data from OpenWeatherMap API"""
     
     def __init__(self):
         """Initialize the weather service"""
-        self.api_key = OPENWEATHER_API_KEY
+        settings = get_settings()
+        self.api_key = settings.openweather_api_key
         self.base_url = OPENWEATHER_BASE_URL
+        self.ttl_current = settings.weather_ttl_current
+        self.ttl_forecast = settings.weather_ttl_forecast
+        # Shared HTTP client, created lazily so it binds to the running event loop
+        self._client: Optional[httpx.AsyncClient] = None
+        # Formatted responses keyed by (location, endpoint) -> (expires_at, data),
+        # least recently used first and capped at cache_size entries
+        self.cache_size = settings.weather_cache_size
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # The fetch currently running for each missed key; concurrent misses await
+        # the same task, so one upstream request serves them all
+        self._in_flight: Dict[Tuple[str, str], "asyncio.Task[Dict[str, Any]]"] = {}
         
         if self.api_key == "your_openweather_api_key_here":
             logger.warning("OpenWeatherMap API key not configured. Please set OPENWEATHER_API_KEY environment variable.")
+
+    async def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared HTTP client, creating it on first use.
+
+        Reusing one client keeps connections to OpenWeatherMap alive between
+        requests instead of paying DNS + TCP + TLS setup on every call, and
+        HTTP/2 lets concurrent requests share a single connection.
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=True,
+                timeout=10,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=75),
+            )
+        return self._client
+
+    async def close(self):
+        """Close the shared HTTP client, if one was opened"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
     
+    async def _cached(
+        self,
+        key: Tuple[str, str],
+        ttl: float,
+        fetch: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """Return the cached value for key if younger than ttl, otherwise fetch it.
+
+        Concurrent callers missing on the same key share one in-flight fetch, so
+        only one request hits OpenWeatherMap and every caller gets its result or
+        its exception.
+        """
+        entry = self._cache_lookup(key)
+        if entry is not None:
+            return entry
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_and_store(key, ttl, fetch))
+            # Mark the exception retrieved even if every caller was cancelled
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._in_flight[key] = task
+        # A caller going away (e.g. client disconnect) must not cancel the fetch
+        # for the others
+        return await asyncio.shield(task)
+
+    async def _fetch_and_store(
+        self,
+        key: Tuple[str, str],
+        ttl: float,
+        fetch: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """Fetch the value for key and cache it; runs as the shared in-flight task"""
+        try:
+            data = await fetch()
+            self._cache_store(key, ttl, data)
+            return data
+        finally:
+            # Later callers find the result in the cache, or retry after a failure
+            del self._in_flight[key]
+
+    def _cache_lookup(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        """Return the unexpired cached value for key, marking it recently used"""
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return entry[1]
+
+    def _cache_store(self, key: Tuple[str, str], ttl: float, data: Dict[str, Any]):
+        """Cache data for ttl seconds, dropping expired and least recently used entries"""
+        now = time.monotonic()
+        for stale_key in [k for k, (expires_at, _) in self._cache.items() if expires_at <= now]:
+            del self._cache[stale_key]
+        self._cache[key] = (now + ttl, data)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
     async def get_current_weather(self, location: str) -> Dict[str, Any]:
         """
-        Get current weather data for a location
+        Get current weather data for a location, cached for ttl_current seconds
         
         Args:
             location (str): City name or "city,country_code"
@@ -26,27 +130,34 @@ class WeatherService:
         Returns:
             Dict[str, Any]: Current weather data
         """
+        return await self._cached(
+            (location, "current"),
+            self.ttl_current,
+            lambda: self._fetch_current_weather(location),
+        )
+
+    async def _fetch_current_weather(self, location: str) -> Dict[str, Any]:
+        """Fetch current weather for a location from OpenWeatherMap"""
         try:
-            url = f"{self.base_url}/weather"
             params = {
                 "q": location,
                 "appid": self.api_key,
                 "units": "metric"  # Use Celsius
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return self._format_current_weather(data)
-                    elif response.status == 401:
-                        raise Exception("Invalid API key for OpenWeatherMap")
-                    elif response.status == 404:
-                        raise Exception(f"Location '{location}' not found")
-                    else:
-                        raise Exception(f"Weather API error: {response.status}")
+            client = await self._get_client()
+            response = await client.get("weather", params=params)
+            if response.status_code == 200:
+                data = response.json()
+                return self._format_current_weather(data)
+            elif response.status_code == 401:
+                raise Exception("Invalid API key for OpenWeatherMap")
+            elif response.status_code == 404:
+                raise Exception(f"Location '{location}' not found")
+            else:
+                raise Exception(f"Weather API error: {response.status_code}")
                         
-        except aiohttp.ClientError as e:
+        except httpx.HTTPError as e:
             logger.error(f"Network error fetching weather: {e}")
             raise Exception("Unable to connect to weather service")
         except Exception as e:
@@ -55,7 +166,7 @@ class WeatherService:
     
     async def get_forecast(self, location: str, days: int = 5) -> Dict[str, Any]:
         """
-        Get weather forecast for a location
+        Get weather forecast for a location, cached for ttl_forecast seconds
         
         Args:
             location (str): City name or "city,country_code"
@@ -64,8 +175,15 @@ class WeatherService:
         Returns:
             Dict[str, Any]: Weather forecast data
         """
+        return await self._cached(
+            (location, f"forecast:{days}"),
+            self.ttl_forecast,
+            lambda: self._fetch_forecast(location, days),
+        )
+
+    async def _fetch_forecast(self, location: str, days: int) -> Dict[str, Any]:
+        """Fetch the forecast for a location from OpenWeatherMap"""
         try:
-            url = f"{self.base_url}/forecast"
             params = {
                 "q": location,
                 "appid": self.api_key,
@@ -73,19 +191,19 @@ class WeatherService:
                 "cnt": min(days * 8, 40)  # 8 forecasts per day (3-hour intervals), max 40
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return self._format_forecast(data, days)
-                    elif response.status == 401:
-                        raise Exception("Invalid API key for OpenWeatherMap")
-                    elif response.status == 404:
-                        raise Exception(f"Location '{location}' not found")
-                    else:
-                        raise Exception(f"Weather API error: {response.status}")
+            client = await self._get_client()
+            response = await client.get("forecast", params=params)
+            if response.status_code == 200:
+                data = response.json()
+                return self._format_forecast(data, days)
+            elif response.status_code == 401:
+                raise Exception("Invalid API key for OpenWeatherMap")
+            elif response.status_code == 404:
+                raise Exception(f"Location '{location}' not found")
+            else:
+                raise Exception(f"Weather API error: {response.status_code}")
                         
-        except aiohttp.ClientError as e:
+        except httpx.HTTPError as e:
             logger.error(f"Network error fetching forecast: {e}")
             raise Exception("Unable to connect to weather service")
         except Exception as e:
@@ -103,43 +221,49 @@ class WeatherService:
             Dict[str, Any]: Formatted weather data
         """
         try:
+            main = raw_data.get("main") or _EMPTY
+            weather = (raw_data.get("weather") or _EMPTY_LIST)[0]
+            wind = raw_data.get("wind") or _EMPTY
+            sys_info = raw_data.get("sys") or _EMPTY
+            coord = raw_data.get("coord") or _EMPTY
             return {
                 "location": {
                     "name": raw_data.get("name"),
-                    "country": raw_data.get("sys", {}).get("country"),
+                    "country": sys_info.get("country"),
                     "coordinates": {
-                        "lat": raw_data.get("coord", {}).get("lat"),
-                        "lon": raw_data.get("coord", {}).get("lon")
+                        "lat": coord.get("lat"),
+                        "lon": coord.get("lon")
                     }
                 },
                 "current": {
-                    "temperature": round(raw_data.get("main", {}).get("temp", 0), 1),
-                    "feels_like": round(raw_data.get("main", {}).get("feels_like", 0), 1),
-                    "humidity": raw_data.get("main", {}).get("humidity"),
-                    "pressure": raw_data.get("main", {}).get("pressure"),
-                    "description": raw_data.get("weather", [{}])[0].get("description", "").title(),
-                    "main": raw_data.get("weather", [{}])[0].get("main"),
-                    "icon": raw_data.get("weather", [{}])[0].get("icon"),
+                    "temperature": round(main.get("temp", 0), 1),
+                    "feels_like": round(main.get("feels_like", 0), 1),
+                    "humidity": main.get("humidity"),
+                    "pressure": main.get("pressure"),
+                    "description": weather.get("description", "").title(),
+                    "main": weather.get("main"),
+                    "icon": weather.get("icon"),
                     "visibility": raw_data.get("visibility", 0) / 1000,  # Convert to km
                     "uv_index": None  # Not available in current weather endpoint
                 },
                 "wind": {
-                    "speed": raw_data.get("wind", {}).get("speed"),
-                    "direction": raw_data.get("wind", {}).get("deg"),
-                    "gust": raw_data.get("wind", {}).get("gust")
+                    "speed": wind.get("speed"),
+                    "direction": wind.get("deg"),
+                    "gust": wind.get("gust")
                 },
                 "clouds": {
-                    "coverage": raw_data.get("clouds", {}).get("all")
+                    "coverage": (raw_data.get("clouds") or _EMPTY).get("all")
                 },
                 "sun": {
-                    "sunrise": raw_data.get("sys", {}).get("sunrise"),
-                    "sunset": raw_data.get("sys", {}).get("sunset")
+                    "sunrise": sys_info.get("sunrise"),
+                    "sunset": sys_info.get("sunset")
                 },
                 "timestamp": raw_data.get("dt")
             }
         except Exception as e:
             logger.error(f"Error formatting current weather data: {e}")
-            return raw_data
+            # Raw OpenWeatherMap data doesn't fit the response model, so fail loudly
+            raise Exception(f"Unexpected current weather data from OpenWeatherMap: {str(e)}")
     
     def _format_forecast(self, raw_data: Dict[str, Any], days: int) -> Dict[str, Any]:
         """
@@ -153,33 +277,37 @@ class WeatherService:
             Dict[str, Any]: Formatted forecast data
         """
         try:
-            city_info = raw_data.get("city", {})
+            city_info = raw_data.get("city") or _EMPTY
+            coord = city_info.get("coord") or _EMPTY
             forecasts = raw_data.get("list", [])
             
             formatted_forecasts = []
             for forecast in forecasts[:days * 8]:  # Limit to requested days
+                main = forecast.get("main") or _EMPTY
+                weather = (forecast.get("weather") or _EMPTY_LIST)[0]
+                wind = forecast.get("wind") or _EMPTY
                 formatted_forecast = {
                     "datetime": forecast.get("dt"),
                     "temperature": {
-                        "current": round(forecast.get("main", {}).get("temp", 0), 1),
-                        "min": round(forecast.get("main", {}).get("temp_min", 0), 1),
-                        "max": round(forecast.get("main", {}).get("temp_max", 0), 1),
-                        "feels_like": round(forecast.get("main", {}).get("feels_like", 0), 1)
+                        "current": round(main.get("temp", 0), 1),
+                        "min": round(main.get("temp_min", 0), 1),
+                        "max": round(main.get("temp_max", 0), 1),
+                        "feels_like": round(main.get("feels_like", 0), 1)
                     },
-                    "humidity": forecast.get("main", {}).get("humidity"),
-                    "pressure": forecast.get("main", {}).get("pressure"),
+                    "humidity": main.get("humidity"),
+                    "pressure": main.get("pressure"),
                     "weather": {
-                        "main": forecast.get("weather", [{}])[0].get("main"),
-                        "description": forecast.get("weather", [{}])[0].get("description", "").title(),
-                        "icon": forecast.get("weather", [{}])[0].get("icon")
+                        "main": weather.get("main"),
+                        "description": weather.get("description", "").title(),
+                        "icon": weather.get("icon")
                     },
                     "wind": {
-                        "speed": forecast.get("wind", {}).get("speed"),
-                        "direction": forecast.get("wind", {}).get("deg"),
-                        "gust": forecast.get("wind", {}).get("gust")
+                        "speed": wind.get("speed"),
+                        "direction": wind.get("deg"),
+                        "gust": wind.get("gust")
                     },
                     "clouds": {
-                        "coverage": forecast.get("clouds", {}).get("all")
+                        "coverage": (forecast.get("clouds") or _EMPTY).get("all")
                     },
                     "precipitation": {
                         "probability": forecast.get("pop", 0) * 100  # Convert to percentage
@@ -192,8 +320,8 @@ class WeatherService:
                     "name": city_info.get("name"),
                     "country": city_info.get("country"),
                     "coordinates": {
-                        "lat": city_info.get("coord", {}).get("lat"),
-                        "lon": city_info.get("coord", {}).get("lon")
+                        "lat": coord.get("lat"),
+                        "lon": coord.get("lon")
                     }
                 },
                 "forecast": formatted_forecasts,
@@ -202,7 +330,8 @@ class WeatherService:
             
         except Exception as e:
             logger.error(f"Error formatting forecast data: {e}")
-            return raw_data
+            # Raw OpenWeatherMap data doesn't fit the response model, so fail loudly
+            raise Exception(f"Unexpected forecast data from OpenWeatherMap: {str(e)}")
 
     # History-related functionality removed per request; this service now
     # focuses on current weather and forecast via OpenWeatherMap only.
\ No newline at end of file